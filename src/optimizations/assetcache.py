@@ -9,7 +9,7 @@ a short expiry header to a server with an extremely long expiry header.
 """
 from __future__ import unicode_literals
 
-import hashlib, os.path, fnmatch, re
+import hashlib, os.path, fnmatch, re, tempfile
 from abc import ABCMeta, abstractmethod
 from contextlib import closing
 
@@ -41,6 +41,18 @@ def freeze_dict(params):
     ).encode('utf-8')).hexdigest()
 
 
+def save_temporary_file(storage, name, handle):
+    """
+    Saves the given temporary file to the given storage.
+
+    The file is saved up to its current position.
+    """
+    file = File(handle)
+    file.size = handle.tell()
+    handle.seek(0)
+    storage.save(name, file)
+
+
 class Asset(six.with_metaclass(ABCMeta)):
 
     """An asset that is available to the asset cache."""
@@ -334,6 +346,20 @@ class GroupedAsset(Asset):
         """Loads all the js code."""
         return force_bytes(self.join_str).join(asset.get_contents() for asset in self._assets)
 
+    def iter_contents(self):
+        """
+        Iterates over chunks of the contents of all the assets.
+
+        This avoids loading all the assets into memory at once.
+        """
+        join_str = force_bytes(self.join_str)
+        for n, asset in enumerate(self._assets):
+            if n > 0 and join_str:
+                yield join_str
+            with closing(asset.open()) as handle:
+                for chunk in handle.chunks():
+                    yield chunk
+
     def get_hash(self):
         """Returns the sha1 hash of this asset's contents."""
         return hashlib.sha1("".join(asset.get_hash() for asset in self._assets).encode("utf-8")).hexdigest()
@@ -342,6 +368,13 @@ class GroupedAsset(Asset):
         """Returns an open file pointer."""
         return ContentFile(self.get_contents())
 
+    def save(self, storage, name, meta):
+        """Saves this asset to the given storage."""
+        with tempfile.TemporaryFile() as handle:
+            for chunk in self.iter_contents():
+                handle.write(chunk)
+            save_temporary_file(storage, name, handle)
+
 
 class AdaptiveAsset(Asset):
 
@@ -1,10 +1,13 @@
 """A cache of javascipt files, optionally compressed."""
 from __future__ import unicode_literals
 
+import itertools
+import tempfile
+
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.utils import six
 
-from optimizations.assetcache import default_asset_cache, GroupedAsset, AdaptiveAsset
+from optimizations.assetcache import default_asset_cache, GroupedAsset, AdaptiveAsset, StaticAsset, save_temporary_file
 from optimizations.assetcompiler import default_asset_compiler, AssetCompilerPluginBase
 from optimizations.javascriptcompiler import default_javascript_compiler
 
@@ -26,17 +29,21 @@ class JavascriptAsset(GroupedAsset):
         params = super(JavascriptAsset, self).get_id_params()
         params["compile"] = self._compile
         params["rescope"] = self._rescope
+        # Different backends produce different output, so give each its own asset.
+        if self._compile:
+            params["compiler"] = default_javascript_compiler.get_backend().name
         return params
             
     def save(self, storage, name, meta):
         """Saves this asset to the given storage."""
         if self._compile:
-            contents = self.get_contents()
+            chunks = self.iter_contents()
             if self._rescope:
-                contents = "(function(window){%s}(window));" % contents
-            compiled_contents = default_javascript_compiler.compile(contents, force_compile=True)
-            # Write the output.
-            storage.save(name, ContentFile(compiled_contents))
+                chunks = itertools.chain((b"(function(window){",), chunks, (b"}(window));",))
+            with tempfile.TemporaryFile() as handle:
+                default_javascript_compiler.compile_to(chunks, handle, force_compile=True)
+                # Write the output.
+                save_temporary_file(storage, name, handle)
         else:
             # Just save the joined code.
             super(JavascriptAsset, self).save(storage, name, meta)
@@ -46,9 +53,33 @@ class JavascriptCache(object):
     
     """A cache of javascript files."""
     
-    def __init__(self, asset_cache=default_asset_cache):
+    def __init__(self, asset_cache=default_asset_cache, max_url_cache_size=4096):
         """Initializes the thumbnail cache."""
         self._asset_cache = asset_cache
+        self._url_cache = {}
+        self._max_url_cache_size = max_url_cache_size
+    
+    def _get_debug_url(self, asset):
+        """
+        Returns the uncompiled URL of the given asset.
+
+        URLs of static assets are memoized, since they are stable for a given
+        static file name.
+        """
+        if isinstance(asset, six.string_types):
+            key = asset
+        elif isinstance(asset, StaticAsset):
+            key = asset.get_name()
+        else:
+            return self._asset_cache.get_url(asset, force_save=False)
+        try:
+            return self._url_cache[key]
+        except KeyError:
+            url = self._asset_cache.get_url(asset, force_save=False)
+            if len(self._url_cache) >= self._max_url_cache_size:
+                self._url_cache.clear()
+            self._url_cache[key] = url
+            return url
     
     def get_urls(self, assets, compile=True, rescope=False, force_save=None):
         """Returns a sequence of script URLs for the given assets."""
@@ -58,7 +89,7 @@ class JavascriptCache(object):
             if assets:
                 return [self._asset_cache.get_url(JavascriptAsset(list(map(AdaptiveAsset, assets)), compile, rescope), force_save=True)]
             return []
-        return [self._asset_cache.get_url(asset) for asset in assets]
+        return tuple(map(self._get_debug_url, assets))
         
         
 # The default javascript cache.
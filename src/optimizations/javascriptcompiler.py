@@ -1,12 +1,26 @@
 """A general-purpose javascript compiler."""
 from __future__ import unicode_literals
 
-import os.path, subprocess
+import abc, atexit, errno, os.path, shutil, signal, socket, stat, struct, subprocess, tempfile, threading, time
+from contextlib import closing
+from io import BytesIO
 
 from django.conf import settings
 from django.utils import six
 
-import optimizations
+from optimizations.utils import YUICOMPRESSOR_PATH, COPY_BUFFER_SIZE
+
+
+# The command line used to run yuicompressor on javascript.
+_JS_COMPRESSOR_ARGV = ("java", "-jar", YUICOMPRESSOR_PATH, "--type", "js", "--charset", "utf-8", "-v")
+
+# The yuicompressor main class, and the nailgun server main class used to host it.
+_COMPRESSOR_MAIN_CLASS = "com.yahoo.platform.yui.compressor.Bootstrap"
+
+_NAILGUN_SERVER_CLASS = "com.martiansoftware.nailgun.NGServer"
+
+# How long to wait for a newly-started nailgun server to accept connections.
+NAILGUN_STARTUP_TIMEOUT = 30
 
 
 class JavascriptError(Exception):
@@ -19,13 +33,557 @@ class JavascriptError(Exception):
         self.detail_message = detail_message
 
 
+class JavascriptBackendBase(six.with_metaclass(abc.ABCMeta)):
+
+    """Base class for javascript compiler backends."""
+
+    # The name of the backend, used to tell apart assets compiled by different backends.
+    name = None
+
+    def is_available(self):
+        """Tests whether this backend can be used in the current environment."""
+        return True
+
+    @abc.abstractmethod
+    def compile(self, source):
+        """Compiles the given javascript source bytes, returning the compiled bytes."""
+        raise NotImplementedError
+
+    def compile_to(self, chunks, handle):
+        """Compiles the given iterable of javascript source chunks, writing the compiled bytes to the given file."""
+        handle.write(self.compile(b"".join(chunks)))
+
+
+_nailgun_lock = threading.Lock()
+
+_nailgun_address = None
+
+_nailgun_process = None
+
+_nailgun_pidfile = None
+
+
+def _get_nailgun_dir():
+    """
+    Returns the private directory used for the nailgun socket and pidfile.
+
+    This is settings.OPTIMIZATIONS_NAILGUN_DIR, or a per-user directory in the
+    temp dir. If the directory is not a directory owned by the current user
+    and inaccessible to anyone else, then None is returned, since another
+    user could then plant a fake server.
+    """
+    if not hasattr(os, "getuid"):
+        return None
+    path = getattr(settings, "OPTIMIZATIONS_NAILGUN_DIR", None) or os.path.join(tempfile.gettempdir(), "optimizations-nailgun-{uid}".format(
+        uid = os.getuid(),
+    ))
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as ex:
+        if ex.errno != errno.EEXIST:
+            raise
+    path_stat = os.lstat(path)
+    if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_uid != os.getuid() or path_stat.st_mode & 0o077:
+        return None
+    return path
+
+
+def _get_nailgun_pidfile(nailgun_dir, address):
+    """Returns the path of the pidfile used to record the nailgun server listening on the given address."""
+    if isinstance(address, six.string_types):
+        name = os.path.basename(address)
+    else:
+        name = "{host}-{port}".format(host=address[0], port=address[1])
+    return os.path.join(nailgun_dir, "{name}.pid".format(name=name))
+
+
+def _read_nailgun_pid(pidfile):
+    """
+    Returns the pid of the running nailgun server recorded in the given pidfile, or None.
+
+    Only a live process owned by the current user is trusted.
+    """
+    try:
+        if os.stat(pidfile).st_uid != os.getuid():
+            return None
+        with open(pidfile, "r") as handle:
+            pid = int(handle.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        if ex.errno == errno.EPERM:
+            # The process belongs to another user, so it is not our server.
+            return None
+        # The server has died, so the pidfile is stale.
+        _remove_file(pidfile)
+        return None
+    return pid
+
+
+def _remove_file(path):
+    """Removes the given file, if it exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _connect_nailgun(address):
+    """Opens a connection to the nailgun server listening on the given address."""
+    if isinstance(address, six.string_types):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(address)
+        except:
+            connection.close()
+            raise
+        return connection
+    return socket.create_connection(address)
+
+
+def _stop_nailgun():
+    """Stops the nailgun server started by this process, if any."""
+    global _nailgun_process, _nailgun_pidfile, _nailgun_address
+    with _nailgun_lock:
+        if _nailgun_process is not None and _nailgun_process.poll() is None:
+            _nailgun_process.terminate()
+            _nailgun_process.wait()
+            _remove_file(_nailgun_pidfile)
+        _nailgun_process = None
+        _nailgun_pidfile = None
+        _nailgun_address = None
+
+
+atexit.register(_stop_nailgun)
+
+
+def _reset_nailgun(address):
+    """Forgets the given nailgun server address, after a connection to it has failed."""
+    global _nailgun_address
+    with _nailgun_lock:
+        if _nailgun_address == address:
+            _nailgun_address = None
+
+
+def _ensure_nailgun():
+    """
+    Returns the address of a nailgun server hosting yuicompressor.
+
+    The server is started if it is not already running, and its pid is
+    recorded in a pidfile in a private directory, so that other processes
+    run by the same user can share it. If settings.OPTIMIZATIONS_NAILGUN_JAR
+    is not set, the private directory is unsafe, or something other than a
+    recorded nailgun server is listening on the address, then None is
+    returned.
+    """
+    global _nailgun_address, _nailgun_process, _nailgun_pidfile
+    nailgun_jar = getattr(settings, "OPTIMIZATIONS_NAILGUN_JAR", None)
+    if nailgun_jar is None:
+        return None
+    with _nailgun_lock:
+        if _nailgun_address is None:
+            nailgun_dir = _get_nailgun_dir()
+            if nailgun_dir is None:
+                return None
+            address = getattr(settings, "OPTIMIZATIONS_NAILGUN_ADDRESS", None) or os.path.join(nailgun_dir, "nailgun.sock")
+            if not isinstance(address, six.string_types):
+                address = tuple(address)
+            pidfile = _get_nailgun_pidfile(nailgun_dir, address)
+            try:
+                _connect_nailgun(address).close()
+            except socket.error:
+                listening = False
+            else:
+                listening = True
+            recorded_pid = _read_nailgun_pid(pidfile)
+            running = recorded_pid is not None
+            if listening and not running:
+                # Something else is listening on the address, so do not trust it.
+                return None
+            if not listening:
+                if running:
+                    # A recorded server is starting up, or has hung.
+                    process = None
+                else:
+                    # Start a new server, which is stopped when this process exits.
+                    if isinstance(address, six.string_types):
+                        # Remove a socket left behind by a dead server.
+                        _remove_file(address)
+                        server_address = "local:{path}".format(path=address)
+                    else:
+                        server_address = "{host}:{port}".format(host=address[0], port=address[1])
+                    with open(os.devnull, "r+b") as devnull:
+                        process = subprocess.Popen(
+                            ("java", "-cp", os.pathsep.join((nailgun_jar, YUICOMPRESSOR_PATH)), _NAILGUN_SERVER_CLASS, server_address),
+                            stdin = devnull,
+                            stdout = devnull,
+                            stderr = devnull,
+                        )
+                    _nailgun_process = process
+                    _nailgun_pidfile = pidfile
+                    with open(pidfile, "w") as handle:
+                        handle.write("{pid}\n".format(pid=process.pid))
+                # Wait for the server to start listening.
+                deadline = time.time() + NAILGUN_STARTUP_TIMEOUT
+                while True:
+                    try:
+                        _connect_nailgun(address).close()
+                    except socket.error:
+                        if process is not None and process.poll() is not None:
+                            return None
+                        if time.time() > deadline:
+                            # The server never started listening, so stop it, rather
+                            # than leaving it for the next call to wait on.
+                            if process is None:
+                                try:
+                                    os.kill(recorded_pid, signal.SIGTERM)
+                                except OSError:
+                                    pass
+                            else:
+                                process.terminate()
+                                process.wait()
+                                _nailgun_process = None
+                                _nailgun_pidfile = None
+                            _remove_file(pidfile)
+                            return None
+                        time.sleep(0.1)
+                    else:
+                        break
+            _nailgun_address = address
+    return _nailgun_address
+
+
+def _nailgun_chunk(chunk_type, data=b""):
+    """Encodes a nailgun protocol chunk."""
+    return struct.pack(">Ic", len(data), chunk_type) + data
+
+
+def _read_exactly(handle, length):
+    """Reads exactly the given number of bytes from the given file."""
+    data = handle.read(length)
+    if len(data) != length:
+        raise JavascriptError("Error while compiling javascript.", b"Nailgun server closed the connection unexpectedly.")
+    return data
+
+
+class YuiCompressorBackend(JavascriptBackendBase):
+
+    """
+    Compiles javascript by running the bundled yuicompressor.jar.
+
+    If settings.OPTIMIZATIONS_NAILGUN_JAR is set, then yuicompressor is run
+    inside a persistent nailgun server, avoiding JVM startup for each
+    compilation. Otherwise, a new JVM is started each time.
+
+    Nailgun has no authentication, so any local user who can connect to the
+    server can run arbitrary java classes as the user running the server.
+    The server therefore listens on a unix socket in a private directory by
+    default. Setting settings.OPTIMIZATIONS_NAILGUN_ADDRESS to a TCP
+    (host, port) address exposes it to every local user.
+    """
+
+    name = "yuicompressor"
+
+    def compile(self, source):
+        """Compiles the given javascript source bytes."""
+        handle = BytesIO()
+        self.compile_to((source,), handle)
+        return handle.getvalue()
+
+    def compile_to(self, chunks, handle):
+        """
+        Compiles the given iterable of javascript source chunks, writing the compiled bytes to the given file.
+
+        The source chunks are streamed to the compressor, and the compiled
+        output is streamed directly into the file, rather than being
+        buffered in memory.
+        """
+        for _ in range(2):
+            nailgun_address = _ensure_nailgun()
+            if nailgun_address is None:
+                break
+            try:
+                connection = _connect_nailgun(nailgun_address)
+            except socket.error:
+                # The server has died, so forget it and try to restart it.
+                _reset_nailgun(nailgun_address)
+            else:
+                with closing(connection):
+                    self._compile_nailgun(connection, chunks, handle)
+                return
+        # Fall back to running a new JVM.
+        process = subprocess.Popen(
+            _JS_COMPRESSOR_ARGV,
+            stdin = subprocess.PIPE,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.PIPE,
+        )
+        stderr_parts = []
+        stdin_errors = []
+        def write_stdin():
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+            except Exception as ex:
+                stdin_errors.append(ex)
+            finally:
+                try:
+                    process.stdin.close()
+                except (IOError, OSError):
+                    pass  # The compressor exited early, and will report an error.
+        def read_stderr():
+            stderr_parts.append(process.stderr.read())
+        threads = (
+            threading.Thread(target=write_stdin),
+            threading.Thread(target=read_stderr),
+        )
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        # Stream the output.
+        shutil.copyfileobj(process.stdout, handle, COPY_BUFFER_SIZE)
+        for thread in threads:
+            thread.join()
+        process.stdout.close()
+        process.stderr.close()
+        # Check it all worked.
+        if process.wait() != 0:
+            raise JavascriptError("Error while compiling javascript.", b"".join(stderr_parts))
+        if stdin_errors:
+            raise stdin_errors[0]
+
+    def _compile_nailgun(self, connection, chunks, handle):
+        """Compiles the given iterable of javascript source chunks using the given nailgun server connection."""
+        connection.sendall(b"".join(
+            [_nailgun_chunk(b"A", arg.encode("utf-8")) for arg in _JS_COMPRESSOR_ARGV[3:]] +
+            [
+                _nailgun_chunk(b"D", os.getcwd().encode("utf-8")),
+                _nailgun_chunk(b"C", _COMPRESSOR_MAIN_CLASS.encode("utf-8")),
+            ]
+        ))
+        # Process the server response, sending input as it is requested.
+        stdin_chunks = (chunk for chunk in chunks if chunk)
+        stderr_parts = []
+        with closing(connection.makefile("rb")) as response:
+            while True:
+                length, chunk_type = struct.unpack(">Ic", _read_exactly(response, 5))
+                data = _read_exactly(response, length)
+                if chunk_type == b"1":
+                    handle.write(data)
+                elif chunk_type == b"2":
+                    stderr_parts.append(data)
+                elif chunk_type == b"S":
+                    stdin_chunk = next(stdin_chunks, None)
+                    if stdin_chunk is None:
+                        connection.sendall(_nailgun_chunk(b"."))
+                    else:
+                        connection.sendall(_nailgun_chunk(b"0", stdin_chunk))
+                elif chunk_type == b"X":
+                    returncode = int(data.strip() or 0)
+                    break
+        # Check it all worked.
+        if returncode != 0:
+            raise JavascriptError("Error while compiling javascript.", b"".join(stderr_parts))
+
+
+# A small node program that minifies framed javascript sources read from stdin.
+#
+# Requests are written as "<length>\n<source>", and responses are written as
+# "<status> <length>\n<result>", where status is either "ok" or "error".
+NODE_MINIFIER_SOURCE = """
+var minify = require(process.argv[1]).minify;
+var buffer = Buffer.alloc(0);
+var queue = Promise.resolve();
+function respond(status, data) {
+    var output = Buffer.from(String(data), "utf8");
+    process.stdout.write(status + " " + output.length + "\\n");
+    process.stdout.write(output);
+}
+function compile(source) {
+    return Promise.resolve().then(function() {
+        return minify(source);
+    }).then(function(result) {
+        if (result.error) {
+            throw result.error;
+        }
+        respond("ok", result.code);
+    }).catch(function(error) {
+        respond("error", error && error.message || error);
+    });
+}
+process.stdin.on("data", function(chunk) {
+    buffer = Buffer.concat([buffer, chunk]);
+    for (;;) {
+        var newline = buffer.indexOf(10);
+        if (newline === -1) {
+            break;
+        }
+        var length = parseInt(buffer.slice(0, newline).toString("ascii"), 10);
+        if (buffer.length < newline + 1 + length) {
+            break;
+        }
+        var source = buffer.slice(newline + 1, newline + 1 + length).toString("utf8");
+        buffer = buffer.slice(newline + 1 + length);
+        queue = queue.then(compile.bind(null, source));
+    }
+});
+"""
+
+
+class NodeBackend(JavascriptBackendBase):
+
+    """
+    Compiles javascript using a node minifier module, such as terser or uglify-js.
+
+    A single node process is started lazily, and reused for all subsequent
+    compilations, avoiding the startup cost of a new process per asset.
+    """
+
+    def __init__(self, module_name):
+        """Initializes the node backend."""
+        self.name = module_name
+        self._module_name = module_name
+        self._process = None
+        self._stderr = None
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """Tests whether node and the minifier module are installed."""
+        try:
+            with open(os.devnull, "wb") as devnull:
+                return subprocess.call(
+                    ("node", "-e", "require.resolve(process.argv[1])", self._module_name),
+                    stdout = devnull,
+                    stderr = devnull,
+                ) == 0
+        except OSError:
+            return False
+
+    def _get_process(self):
+        """Returns the running node process, starting it if required."""
+        if self._process is None or self._process.poll() is not None:
+            # Send stderr to a temporary file, so that a chatty minifier cannot
+            # fill up an undrained pipe and block the process.
+            if self._stderr is not None:
+                self._stderr.close()
+            self._stderr = tempfile.TemporaryFile()
+            self._process = subprocess.Popen(
+                ("node", "-e", NODE_MINIFIER_SOURCE, self._module_name),
+                stdin = subprocess.PIPE,
+                stdout = subprocess.PIPE,
+                stderr = self._stderr,
+            )
+        return self._process
+
+    def compile(self, source):
+        """Compiles the given javascript source bytes."""
+        with self._lock:
+            process = self._get_process()
+            try:
+                process.stdin.write("{length}\n".format(length=len(source)).encode("ascii"))
+                process.stdin.write(source)
+                process.stdin.flush()
+                header = process.stdout.readline()
+            except (IOError, OSError):
+                header = b""
+            if not header:
+                # The node process has died, so report why.
+                process.kill()
+                process.wait()
+                for pipe in (process.stdin, process.stdout):
+                    try:
+                        pipe.close()
+                    except (IOError, OSError):
+                        pass
+                self._stderr.seek(0)
+                stderrdata = self._stderr.read()
+                self._stderr.close()
+                self._process = None
+                self._stderr = None
+                raise JavascriptError("Error while compiling javascript.", stderrdata)
+            status, length = header.split()
+            result = process.stdout.read(int(length))
+        # Check it all worked.
+        if status != b"ok":
+            raise JavascriptError("Error while compiling javascript.", result)
+        return result
+
+
+class PythonBackend(JavascriptBackendBase):
+
+    """Compiles javascript in-process using a pure-python minifier, such as rjsmin or jsmin."""
+
+    def __init__(self, module_name):
+        """Initializes the python backend."""
+        self.name = module_name
+        self._module_name = module_name
+
+    def is_available(self):
+        """Tests whether the minifier module is installed."""
+        try:
+            __import__(self._module_name)
+        except ImportError:
+            return False
+        return True
+
+    def compile(self, source):
+        """Compiles the given javascript source bytes."""
+        jsmin = __import__(self._module_name).jsmin
+        try:
+            return jsmin(source.decode("utf-8")).encode("utf-8")
+        except Exception as ex:
+            raise JavascriptError("Error while compiling javascript.", str(ex).encode("utf-8"))
+
+
+# The available javascript compiler backends, in order of preference.
+JAVASCRIPT_BACKENDS = (
+    ("terser", NodeBackend("terser")),
+    ("uglify-js", NodeBackend("uglify-js")),
+    ("rjsmin", PythonBackend("rjsmin")),
+    ("jsmin", PythonBackend("jsmin")),
+    ("yuicompressor", YuiCompressorBackend()),
+)
+
+
+def get_javascript_backend(name=None):
+    """
+    Returns the javascript compiler backend with the given name.
+
+    If no name is given, then settings.OPTIMIZATIONS_JS_COMPILER is used. If this
+    is "auto", then the first available backend is returned.
+    """
+    if name is None:
+        name = getattr(settings, "OPTIMIZATIONS_JS_COMPILER", "auto")
+    backends = dict(JAVASCRIPT_BACKENDS)
+    if name == "auto":
+        for backend_name, backend in JAVASCRIPT_BACKENDS:
+            if backend.is_available():
+                return backend
+        return backends["yuicompressor"]
+    try:
+        return backends[name]
+    except KeyError:
+        raise ValueError("{name} is not a valid javascript compiler. Should be one of auto, {names}.".format(
+            name = name,
+            names = ", ".join(backend_name for backend_name, _ in JAVASCRIPT_BACKENDS),
+        ))
+
+
 class JavascriptCompiler(object):
 
     """A compiler of javascript code."""
 
-    def __init__(self, cache_name="optimizations.javascriptcompiler"):
+    def __init__(self, cache_name="optimizations.javascriptcompiler", backend=None):
         """Initializes the JavascriptCompiler."""
-        self._compressor_path = os.path.join(os.path.abspath(os.path.dirname(optimizations.__file__)), "resources", "yuicompressor.jar")
+        self._backend = backend
+
+    def get_backend(self):
+        """Returns the backend used to compile javascript."""
+        if self._backend is None:
+            self._backend = get_javascript_backend()
+        return self._backend
 
     def compile(self, source, force_compile=None):
         """Compiles the given javascript source code."""
@@ -38,18 +596,28 @@ class JavascriptCompiler(object):
         if not force_compile:
             return source
         # Compile the source.
-        process = subprocess.Popen(
-            ("java", "-jar", self._compressor_path, "--type", "js", "--charset", "utf-8", "-v"),
-            stdin = subprocess.PIPE,
-            stdout = subprocess.PIPE,
-            stderr = subprocess.PIPE,
-        )
-        stdoutdata, stderrdata = process.communicate(source)
+        return self.get_backend().compile(source)
 
-        # Check it all worked.
-        if process.returncode != 0:
-            raise JavascriptError("Error while compiling javascript.", stderrdata)
-        return stdoutdata
+    def compile_to(self, source, handle, force_compile=None):
+        """
+        Compiles the given javascript source code, writing it to the given file.
+
+        The source may be a string, or an iterable of byte chunks.
+        """
+        if force_compile is None:
+            force_compile = not settings.DEBUG
+        # Convert to chunks.
+        if isinstance(source, six.string_types):
+            source = source.encode("utf-8")
+        if isinstance(source, six.binary_type):
+            source = (source,)
+        # Don't compile in debug mode.
+        if not force_compile:
+            for chunk in source:
+                handle.write(chunk)
+            return
+        # Compile the source.
+        self.get_backend().compile_to(source, handle)
 
 
 default_javascript_compiler = JavascriptCompiler()
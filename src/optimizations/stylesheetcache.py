@@ -2,7 +2,6 @@
 from __future__ import unicode_literals
 
 from contextlib import closing
-import os.path
 import re
 import subprocess
 
@@ -15,9 +14,13 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from django.utils.encoding import force_bytes
 
-import optimizations
 from optimizations.assetcache import default_asset_cache, GroupedAsset, AdaptiveAsset
 from optimizations.assetcompiler import AssetCompilerPluginBase, default_asset_compiler
+from optimizations.utils import YUICOMPRESSOR_PATH
+
+
+# The command line used to run yuicompressor on stylesheets.
+_CSS_COMPRESSOR_ARGV = ("java", "-jar", YUICOMPRESSOR_PATH, "--type", "css", "--charset", "utf-8", "-v")
 
 
 class StylesheetError(Exception):
@@ -88,9 +91,8 @@ class StylesheetAsset(GroupedAsset):
         contents = force_bytes(self.join_str).join(file_parts)
         if self._compile:
             # Compress the content.
-            compressor_path = os.path.join(os.path.abspath(os.path.dirname(optimizations.__file__)), "resources", "yuicompressor.jar")
             process = subprocess.Popen(
-                ("java", "-jar", compressor_path, "--type", "css", "--charset", "utf-8", "-v"),
+                _CSS_COMPRESSOR_ARGV,
                 stdin = subprocess.PIPE,
                 stdout = subprocess.PIPE,
                 stderr = subprocess.PIPE,
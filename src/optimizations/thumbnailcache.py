@@ -1,26 +1,63 @@
 """A cache for thumbnailed images."""
 from __future__ import unicode_literals
 
-import collections
+import errno
+import logging
 import sys
 import os.path
+import re
+import shutil
+import struct
+import threading
+import time
+from contextlib import closing
+from functools import partial
 
 try:
     from io import BytesIO as StringIO
 except Exception as e:
     from cStringIO import StringIO
 
+import PIL
 from PIL import Image
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files.base import File
+from django.utils import six
 
-from optimizations.assetcache import default_asset_cache, Asset, AdaptiveAsset
-from optimizations.propertycache import cached_property
+from optimizations.assetcache import default_asset_cache, freeze_dict, Asset, AdaptiveAsset
+from optimizations.utils import resolve_namespaced_cache, COPY_BUFFER_SIZE
 
 
-class Size(collections.namedtuple("SizeBase", ("width", "height",))):
+logger = logging.getLogger(__name__)
 
-    """Represents the size of an image."""
+
+# Pillow-SIMD is a drop-in replacement for Pillow with much faster resampling.
+# Its releases are versioned as post-releases of the matching Pillow version.
+PIL_VERSION = getattr(PIL, "__version__", None) or getattr(PIL, "PILLOW_VERSION", "")
+
+if ".post" in PIL_VERSION:
+    logger.info("Using Pillow-SIMD %s for thumbnail resizing.", PIL_VERSION)
+else:
+    logger.info("Using PIL %s for thumbnail resizing. Install Pillow-SIMD for faster resizing.", PIL_VERSION or "(unknown version)")
+
+# Resizing a region of the source image was added in Pillow 3.4.
+_PIL_VERSION_MATCH = re.match(r"(\d+)\.(\d+)", PIL_VERSION)
+
+_RESIZE_SUPPORTS_BOX = _PIL_VERSION_MATCH is not None and tuple(map(int, _PIL_VERSION_MATCH.groups())) >= (3, 4)
+
+
+class Size(object):
+
+    """
+    Represents the size of an image.
+
+    Sizes behave like a (width, height) tuple for indexing, unpacking and
+    comparison, but use slots for faster creation and attribute access.
+    """
+
+    __slots__ = ("width", "height",)
 
     def __new__(cls, width, height):
         """Creats a new Size."""
@@ -28,7 +65,52 @@ class Size(collections.namedtuple("SizeBase", ("width", "height",))):
             width = int(width)
         if height is not None:
             height = int(height)
-        return tuple.__new__(cls, (width, height))
+        self = object.__new__(cls)
+        self.width = width
+        self.height = height
+        return self
+
+    def __reduce__(self):
+        """Pickles the size."""
+        return (self.__class__, (self.width, self.height,))
+
+    def __repr__(self):
+        """Returns a debug representation of the size."""
+        return "Size(width={width!r}, height={height!r})".format(
+            width = self.width,
+            height = self.height,
+        )
+
+    def __iter__(self):
+        """Iterates over the width and height."""
+        return iter((self.width, self.height,))
+
+    def __len__(self):
+        """Returns the number of dimensions in the size."""
+        return 2
+
+    def __getitem__(self, index):
+        """Returns the width or height by index."""
+        return (self.width, self.height,)[index]
+
+    def __eq__(self, other):
+        """Tests whether the two sizes are equal."""
+        if isinstance(other, Size):
+            return self.width == other.width and self.height == other.height
+        if isinstance(other, tuple):
+            return (self.width, self.height,) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        """Tests whether the two sizes are not equal."""
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        """Returns a hash of the size."""
+        return hash((self.width, self.height,))
 
     @property
     def aspect(self):
@@ -46,14 +128,15 @@ class Size(collections.namedtuple("SizeBase", ("width", "height",))):
         """
         Returns a new Size that is this Size shrunk to fit inside.
         """
-        reference_aspect = reference.aspect
-        width = min(round(self.height * reference_aspect), self.width)
-        height = min(round(self.width / reference_aspect), self.height)
+        reference_width, reference_height = reference
+        # Use integer arithmetic, rounding halves up.
+        width = min((2 * self.height * reference_width + reference_height) // (2 * reference_height), self.width)
+        height = min((2 * self.width * reference_height + reference_width) // (2 * reference_width), self.height)
         return Size(width, height)
 
     def scale(self, x_scale, y_scale):
         """Returns a new Size with it's width and height scaled."""
-        return Size(float(self.width) * x_scale, float(self.height) * y_scale)
+        return Size(self.width * x_scale, self.height * y_scale)
 
 
 # Size adjustment callbacks. These are used to determine the display and data size of the thumbnail.
@@ -83,36 +166,61 @@ def _size_proportional(reference, size):
 
 # Resize callbacks. These are used to actually resize the image data.
 
+RESAMPLE_FILTERS = ("NEAREST", "BOX", "BILINEAR", "HAMMING", "BICUBIC", "LANCZOS", "ANTIALIAS",)
+
+def _get_resample_filter(name):
+    """
+    Returns the PIL resampling filter with the given name, falling back to
+    LANCZOS (called ANTIALIAS in older versions of PIL).
+    """
+    if not isinstance(name, six.string_types) or name.upper() not in RESAMPLE_FILTERS:
+        raise ImproperlyConfigured("settings.OPTIMIZATIONS_RESAMPLE is set to {name}, which is not a valid resample filter. Should be one of {filters}.".format(
+            name = name,
+            filters = ", ".join(RESAMPLE_FILTERS),
+        ))
+    name = name.upper()
+    for name in (name, "LANCZOS", "ANTIALIAS",):
+        resample = getattr(Image, name, None)
+        if resample is not None:
+            return resample
+
+# The resampling filter used by the resize callbacks. BICUBIC is noticeably
+# faster than the default LANCZOS, and is usually good enough for thumbnails.
+_RESAMPLE = _get_resample_filter(getattr(settings, "OPTIMIZATIONS_RESAMPLE", "LANCZOS"))
+
 def _resize(image, image_size, thumbnail_display_size, thumbnail_image_size):
     """
     Resizes the image to exactly match the desired data size, ignoring aspect
     ratio.
     """
-    return image.resize(thumbnail_image_size, Image.ANTIALIAS)
+    return image.resize(tuple(thumbnail_image_size), _RESAMPLE)
 
 def _resize_cropped(image, image_size, thumbnail_display_size, thumbnail_image_size):
     """
     Resizes the image to fit the desired size, preserving aspect ratio by
     cropping, if required.
+
+    The crop is taken from the source image as part of the resize, so only a
+    single resampling pass is needed.
     """
-    # Resize with nice filter.
-    image_aspect = image_size.aspect
-    if image_aspect > thumbnail_image_size.aspect:
+    # Use the actual image size, since draft mode may have loaded a smaller image.
+    source_width, source_height = image.size
+    width, height = thumbnail_image_size
+    # Find the centered region of the source that matches the thumbnail aspect.
+    if source_width * height > source_height * width:
         # Too wide.
-        pre_cropped_size = Size(thumbnail_image_size.height * image_aspect, thumbnail_image_size.height)
+        crop_width = float(source_height * width) / height
+        left = (source_width - crop_width) / 2
+        box = (left, 0, left + crop_width, source_height)
     else:
         # Too tall.
-        pre_cropped_size = Size(thumbnail_image_size.width, thumbnail_image_size.width / image_aspect)
-    # Crop.
-    image = image.resize(pre_cropped_size, Image.ANTIALIAS)
-    source_x = int((pre_cropped_size.width - thumbnail_image_size.width) / 2)
-    source_y = int((pre_cropped_size.height - thumbnail_image_size.height) / 2)
-    return image.crop((
-        source_x,
-        source_y,
-        source_x + thumbnail_image_size.width,
-        source_y + thumbnail_image_size.height,
-    ))
+        crop_height = float(source_width * height) / width
+        top = (source_height - crop_height) / 2
+        box = (0, top, source_width, top + crop_height)
+    # Crop and resize with nice filter.
+    if _RESIZE_SUPPORTS_BOX:
+        return image.resize((width, height), _RESAMPLE, box=box)
+    return image.crop(tuple(int(round(value)) for value in box)).resize((width, height), _RESAMPLE)
 
 
 # Methods of generating thumbnails.
@@ -121,14 +229,17 @@ PROPORTIONAL = "proportional"
 RESIZE = "resize"
 CROP = "crop"
 
-ResizeMethod = collections.namedtuple("ResizeMethod", ("get_display_size", "get_data_size", "do_resize", "hash_key",))
-
+# Each method is a (get_display_size, get_data_size, do_resize, hash_key) tuple.
+# The do_resize callback is responsible for choosing a resampling filter, so
+# alternative methods can use a different filter to settings.OPTIMIZATIONS_RESAMPLE.
 _methods = {
-    PROPORTIONAL: ResizeMethod(_size_proportional, _size, _resize, "resize"),
-    RESIZE: ResizeMethod(_size, _size, _resize, "resize"),
-    CROP: ResizeMethod(_size, _size_proportional, _resize_cropped, "crop"),
+    PROPORTIONAL: (_size_proportional, _size, _resize, "resize"),
+    RESIZE: (_size, _size, _resize, "resize"),
+    CROP: (_size, _size_proportional, _resize_cropped, "crop"),
 }
 
+_METHOD_NAMES = ", ".join(sorted(_methods.keys()))
+
 
 class ThumbnailError(Exception):
 
@@ -139,12 +250,13 @@ class ThumbnailAsset(Asset):
 
     """An asset representing a thumbnailed file."""
 
-    def __init__(self, asset, width, height, method):
+    def __init__(self, asset, width, height, method, size_cache=None):
         """Initializes the asset."""
         self._asset = asset
         self._width = width
         self._height = height
-        self._method = method
+        self._get_display_size, self._get_data_size, self._do_resize, self._hash_key = method
+        self._image = LazyImage(asset, size_cache)
 
     def open(self):
         """Returns an open File for this asset."""
@@ -167,44 +279,51 @@ class ThumbnailAsset(Asset):
         params = super(ThumbnailAsset, self).get_id_params()
         params["width"] = self._width is None and -1 or self._width
         params["height"] = self._height is None and -1 or self._height
-        params["method"] = self._method.hash_key
+        params["method"] = self._hash_key
         return params
 
-    @cached_property
-    def _image_data_and_size(self):
-        """Returns the image data used by this thumbnail asset."""
-        image_data = open_image(self._asset)
-        return image_data, Size(*image_data.size)
+    def close(self):
+        """Releases the image data used by this thumbnail asset."""
+        self._image.close()
 
     def get_save_meta(self):
         """Returns the meta parameters to associate with the asset in the asset cache."""
-        method = self._method
         requested_size = Size(self._width, self._height)
-        _, original_size = self._image_data_and_size
+        original_size = self._image.size
         # Calculate the final width and height of the thumbnail.
-        display_size = method.get_display_size(original_size, requested_size)
+        display_size = self._get_display_size(original_size, requested_size)
         return {
             "size": display_size
         }
 
     def save(self, storage, name, meta):
         """Saves this asset to the given storage."""
-        method = self._method
         # Calculate sizes.
         display_size = meta["size"]
-        image_data, original_size = self._image_data_and_size
-        data_size = method.get_data_size(display_size, display_size.intersect(original_size))
-        # Check whether we need to make a thumbnail.
-        if data_size == original_size:
-            super(ThumbnailAsset, self).save(storage, name, meta)
+        original_size = self._image.size
+        data_size = self._get_data_size(display_size, display_size.intersect(original_size))
+        # Check whether we need to make a thumbnail. A difference of a pixel
+        # is just rounding, and not worth resampling the image for.
+        if abs(data_size.width - original_size.width) <= 1 and abs(data_size.height - original_size.height) <= 1:
+            # The source image is copied as-is, so it doesn't need to stay open.
+            self._image.close()
+            try:
+                source_path = self._asset.get_path()
+                thumbnail_path = storage.path(name)
+            except NotImplementedError:
+                super(ThumbnailAsset, self).save(storage, name, meta)
+            else:
+                _write_thumbnail(storage, name, thumbnail_path, partial(_copy_file, source_path))
         else:
             # Use efficient image loading.
-            image_data.draft(None, data_size)
-            # Resize the image data.
+            image_data = self._image.get(draft_size=data_size)
+            # Resize the image data, releasing the decoded source as soon as possible.
             try:
-                image_data = method.do_resize(image_data, original_size, display_size, data_size)
+                image_data = self._do_resize(image_data, original_size, display_size, data_size)
             except Exception as ex:  # HACK: PIL raises all sorts of Exceptions :(
                 raise ThumbnailError(str(ex))
+            finally:
+                self._image.close()
             # Parse the image format.
             _, extension = os.path.splitext(name)
             format = extension.lstrip(".").upper().replace("JPG", "JPEG") or "PNG"
@@ -229,22 +348,50 @@ class ThumbnailAsset(Asset):
                 file.size = buffer_length
                 storage.save(name, file)
             else:
-                # We can do an efficient streaming save.
-                try:
-                    os.makedirs(os.path.dirname(thumbnail_path))
-                except OSError:
-                    pass
-                try:
-                    image_data.save(thumbnail_path, format)
-                except Exception as ex:  # HACK: PIL raises all sorts of Exceptions :(
-                    try:
-                        raise ThumbnailError(str(ex))
-                    finally:
-                        # Remove an incomplete file, if present.
-                        try:
-                            os.unlink(thumbnail_path)
-                        except:
-                            pass
+                # We can do an efficient streaming save, with PIL writing
+                # straight into the storage's file.
+                _write_thumbnail(storage, name, thumbnail_path, partial(image_data.save, format=format))
+
+
+def _open_thumbnail(storage, name, thumbnail_dir):
+    """
+    Opens a thumbnail file for writing in the given local storage.
+
+    If the thumbnail directory has been removed since it was created, it is
+    created again.
+    """
+    _ensure_dir(thumbnail_dir)
+    try:
+        return storage.open(name, "wb")
+    except EnvironmentError as ex:
+        if ex.errno != errno.ENOENT:
+            raise
+    # The directory was removed behind our back, so forget it and try again.
+    _created_dirs.discard(thumbnail_dir)
+    _ensure_dir(thumbnail_dir)
+    return storage.open(name, "wb")
+
+
+def _write_thumbnail(storage, name, thumbnail_path, write):
+    """
+    Writes a thumbnail straight into a file opened by the given local storage.
+
+    If writing fails, the incomplete file is removed, and a ThumbnailError is
+    raised.
+    """
+    thumbnail_dir = os.path.dirname(thumbnail_path)
+    try:
+        with closing(_open_thumbnail(storage, name, thumbnail_dir)) as handle:
+            write(handle)
+    except Exception as ex:  # HACK: PIL raises all sorts of Exceptions :(
+        try:
+            raise ThumbnailError(str(ex))
+        finally:
+            # Remove an incomplete file, if present.
+            try:
+                storage.delete(name)
+            except:
+                pass
 
 
 def open_image(asset):
@@ -257,19 +404,244 @@ def open_image(asset):
         return Image.open(asset_path)
 
 
+# JPEG start of frame markers, which contain the image size.
+_JPEG_SOF_MARKERS = frozenset(bytearray(b"\xc0\xc1\xc2\xc3\xc5\xc6\xc7\xc9\xca\xcb\xcd\xce\xcf"))
+
+# JPEG markers that are not followed by a segment length.
+_JPEG_STANDALONE_MARKERS = frozenset(bytearray(b"\x01\xd0\xd1\xd2\xd3\xd4\xd5\xd6\xd7\xd8"))
+
+
+def _fast_image_size(path):
+    """
+    Reads the size of a JPEG, PNG or GIF image from its header, without
+    using PIL.
+
+    Returns None if the image is in another format, or the header could not
+    be parsed.
+    """
+    with open(path, "rb") as handle:
+        header = handle.read(24)
+        # PNG images start with an IHDR chunk.
+        if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+            return struct.unpack(">II", header[16:24])
+        # GIF images have a fixed-size header.
+        if header[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", header[6:10])
+        # JPEG images need their markers walking until a start of frame.
+        if header[:2] == b"\xff\xd8":
+            handle.seek(2)
+            while True:
+                marker = handle.read(2)
+                if len(marker) != 2 or marker[:1] != b"\xff":
+                    return None
+                marker = bytearray(marker)[1]
+                # Skip fill bytes.
+                while marker == 0xff:
+                    marker = bytearray(handle.read(1) or b"\x00")[0]
+                if marker in _JPEG_STANDALONE_MARKERS:
+                    continue
+                segment_header = handle.read(2)
+                if len(segment_header) != 2:
+                    return None
+                segment_length, = struct.unpack(">H", segment_header)
+                if marker in _JPEG_SOF_MARKERS:
+                    frame_header = handle.read(5)
+                    if len(frame_header) != 5:
+                        return None
+                    height, width = struct.unpack(">HH", frame_header[1:])
+                    return width, height
+                if marker in (0xd9, 0xda) or segment_length < 2:
+                    return None  # End of image or start of scan, with no frame.
+                handle.seek(segment_length - 2, os.SEEK_CUR)
+    return None
+
+
+# How long image sizes are kept in the size cache. The cache key includes the
+# image mtime, so entries never go stale, and only expire to free space.
+SIZE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class LazyImage(object):
+
+    """
+    An image that is opened the first time it is used.
+
+    Once opened, the image is reused until it is closed, so the size probe
+    and the thumbnail generation share a single open.
+    """
+
+    def __init__(self, asset, size_cache=None):
+        """
+        Initializes the lazy image.
+
+        If a size cache is given, then the image size is stored in it, so
+        other processes can find the size without opening the image.
+        """
+        self._asset = asset
+        self._size_cache = size_cache
+        self._image = None
+        self._size = None
+
+    def get(self, draft_size=None):
+        """
+        Returns the opened image.
+
+        If a draft size is given, the image decoder is configured to load the
+        image at the smallest scale that is at least that size. This must
+        happen before any pixel data is accessed, so the size probe only
+        reads the image header.
+        """
+        if self._image is None:
+            self._image = open_image(self._asset)
+        if draft_size is not None:
+            self._image.draft(None, tuple(draft_size))
+        return self._image
+
+    def _get_size_cache_key(self):
+        """
+        Returns the key used to store the image size in the size cache.
+
+        If the asset does not support mtimes, then None is returned, since
+        hashing its contents would cost more than probing its size.
+        """
+        try:
+            params = {
+                "id": self._asset.get_id(),
+                "mtime": self._asset.get_mtime(),
+            }
+        except NotImplementedError:
+            return None
+        return "optimizations:thumbnailcache:size:{hash}".format(
+            hash = freeze_dict(params),
+        )
+
+    def _probe_size(self):
+        """
+        Determines the size of the image.
+
+        Local JPEG, PNG and GIF images have their size read directly from the
+        file header, which is much faster than opening them with PIL.
+        """
+        if self._image is None:
+            try:
+                path = self._asset.get_path()
+            except NotImplementedError:
+                pass  # Remote images are opened with PIL, so the download is shared with save().
+            else:
+                size = _fast_image_size(path)
+                if size is not None:
+                    return size
+        return self.get().size
+
+    @property
+    def size(self):
+        """Returns the size of the image."""
+        if self._size is None:
+            size_cache_key = None if self._size_cache is None else self._get_size_cache_key()
+            if size_cache_key is None:
+                self._size = Size(*self._probe_size())
+            else:
+                size = self._size_cache.get(size_cache_key)
+                if size is None:
+                    size = self._probe_size()
+                    self._size_cache.set(size_cache_key, tuple(size), SIZE_CACHE_TIMEOUT)
+                self._size = Size(*size)
+        return self._size
+
+    def close(self):
+        """Releases the opened image, if any."""
+        image = self._image
+        self._image = None
+        if image is not None and hasattr(image, "close"):
+            image.close()
+
+
+# Directories that are known to exist in the thumbnail storage.
+_created_dirs = set()
+
+_created_dirs_lock = threading.Lock()
+
+
+def _ensure_dir(path):
+    """
+    Creates the given directory, if it doesn't already exist.
+
+    Created directories are remembered, so later calls for the same
+    directory don't touch the filesystem.
+    """
+    if path in _created_dirs:
+        return
+    with _created_dirs_lock:
+        if path not in _created_dirs:
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path):
+                        raise
+            _created_dirs.add(path)
+
+
+def _copy_file(source_path, destination):
+    """
+    Copies a file into the given open destination file.
+
+    Where supported, the data is copied by the kernel using copy_file_range
+    or sendfile, so it never passes through userspace.
+    """
+    with open(source_path, "rb") as source:
+        try:
+            source_fd = source.fileno()
+            destination_fd = destination.fileno()
+            remaining = os.fstat(source_fd).st_size
+            if hasattr(os, "copy_file_range"):
+                while remaining > 0:
+                    copied = os.copy_file_range(source_fd, destination_fd, remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                return
+            if hasattr(os, "sendfile"):
+                offset = 0
+                while remaining > 0:
+                    copied = os.sendfile(destination_fd, source_fd, offset, remaining)
+                    if copied == 0:
+                        break
+                    offset += copied
+                    remaining -= copied
+                return
+        except (AttributeError, EnvironmentError, ValueError):
+            # Not supported for these files, so start again in userspace.
+            source.seek(0)
+            destination.seek(0)
+            destination.truncate()
+        shutil.copyfileobj(source, destination, COPY_BUFFER_SIZE)
+
+
 class Thumbnail(object):
 
     """A generated thumbnail."""
 
-    def __init__(self, asset_cache, asset):
+    def __init__(self, asset_cache, asset, name_and_meta=None, on_resolve=None):
         """Initializes the thumbnail."""
         self._asset_cache = asset_cache
         self._asset = asset
+        self._name_and_meta = name_and_meta
+        self._on_resolve = on_resolve
         self.name = asset.get_name()
 
-    @cached_property
+    @property
     def _asset_name_and_meta(self):
-        return self._asset_cache.get_name_and_meta(self._asset)
+        if self._name_and_meta is None:
+            try:
+                name_and_meta = self._asset_cache.get_name_and_meta(self._asset)
+            finally:
+                # Don't keep the source image open once the thumbnail exists.
+                self._asset.close()
+            if self._on_resolve is not None:
+                self._on_resolve(name_and_meta)
+            self._name_and_meta = name_and_meta
+        return self._name_and_meta
 
     @property
     def width(self):
@@ -296,9 +668,27 @@ class ThumbnailCache(object):
 
     """A cache of thumbnailed images."""
 
-    def __init__(self, asset_cache=default_asset_cache):
-        """Initializes the thumbnail cache."""
+    def __init__(self, asset_cache=default_asset_cache, max_thumbnail_cache_size=4096, thumbnail_cache_timeout=None, cache_name="optimizations.thumbnailcache"):
+        """
+        Initializes the thumbnail cache.
+
+        The names and meta of generated thumbnails are memoized in-process for
+        thumbnail_cache_timeout seconds, which defaults to the timeout of the
+        asset cache, so that they never outlive the asset cache's own entries.
+        """
         self._asset_cache = asset_cache
+        self._size_cache = resolve_namespaced_cache(cache_name)
+        self._thumbnail_cache = {}
+        self._max_thumbnail_cache_size = max_thumbnail_cache_size
+        if thumbnail_cache_timeout is None:
+            thumbnail_cache_timeout = getattr(getattr(asset_cache, "_cache", None), "default_timeout", None) or 300
+        self._thumbnail_cache_timeout = thumbnail_cache_timeout
+
+    def _memoize_name_and_meta(self, key, name_and_meta):
+        """Memoizes the name and meta of a generated thumbnail."""
+        if len(self._thumbnail_cache) >= self._max_thumbnail_cache_size:
+            self._thumbnail_cache.clear()
+        self._thumbnail_cache[key] = (time.time() + self._thumbnail_cache_timeout, name_and_meta)
 
     def get_thumbnail(self, asset, width=None, height=None, method=PROPORTIONAL):
         """
@@ -313,12 +703,23 @@ class ThumbnailCache(object):
         except KeyError:
             raise ValueError("{method} is not a valid thumbnail method. Should be one of {methods}.".format(
                 method = method,
-                methods = ", ".join(_methods.keys())
+                methods = _METHOD_NAMES,
             ))
+        _, _, _, hash_key = method
         # Adapt the asset.
         asset = AdaptiveAsset(asset)
-        # Create the thumbnail.
-        return Thumbnail(self._asset_cache, ThumbnailAsset(asset, width, height, method))
+        thumbnail_asset = ThumbnailAsset(asset, width, height, method, self._size_cache)
+        # Look for the name and meta of a previously-created thumbnail.
+        try:
+            key = (asset.get_id(), width, height, hash_key,)
+        except NotImplementedError:
+            return Thumbnail(self._asset_cache, thumbnail_asset)
+        memoized = self._thumbnail_cache.get(key)
+        if memoized is not None:
+            expires, name_and_meta = memoized
+            if expires > time.time():
+                return Thumbnail(self._asset_cache, thumbnail_asset, name_and_meta)
+        return Thumbnail(self._asset_cache, thumbnail_asset, on_resolve=partial(self._memoize_name_and_meta, key))
 
 
 # The default thumbnail cache.
@@ -1,14 +1,33 @@
 """Random utility functions."""
 from __future__ import unicode_literals
 
+import os.path
+
+from django.conf import settings
 from django.core.cache import get_cache, InvalidCacheBackendError, cache as default_cache
 
+import optimizations
+
+
+# The path to the bundled yuicompressor.
+YUICOMPRESSOR_PATH = os.path.join(os.path.abspath(os.path.dirname(optimizations.__file__)), "resources", "yuicompressor.jar")
+
+# The size of the chunks used when copying file data between handles.
+COPY_BUFFER_SIZE = 128 * 1024
+
 
 def resolve_namespaced_cache(name):
-    """Finds the best-matching named cache that exists."""
-    try:
-        return get_cache(name)
-    except (InvalidCacheBackendError, ValueError):
-        if "." in name:
-            return resolve_namespaced_cache(name.rsplit(".", 1)[0])
-        return default_cache
\ No newline at end of file
+    """
+    Finds the best-matching named cache that exists.
+
+    Only names configured in settings.CACHES are looked up, since get_cache
+    would otherwise treat a dotted name as the import path of a cache backend.
+    """
+    if name in getattr(settings, "CACHES", {}):
+        try:
+            return get_cache(name)
+        except (InvalidCacheBackendError, ValueError):
+            pass
+    if "." in name:
+        return resolve_namespaced_cache(name.rsplit(".", 1)[0])
+    return default_cache
\ No newline at end of file
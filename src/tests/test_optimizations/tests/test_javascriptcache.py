@@ -0,0 +1,44 @@
+"""Tests for the javascript cache."""
+
+from django.test import TestCase
+
+from optimizations.assetcache import StaticAsset, FileAsset
+from optimizations.javascriptcache import JavascriptCache, JavascriptAsset
+from optimizations.javascriptcompiler import default_javascript_compiler
+from test_optimizations.tests.base import get_test_javascript_asset
+
+
+class RecordingAssetCache(object):
+
+    """An asset cache that records the calls made to get_url."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_url(self, asset, force_save=None):
+        self.calls.append((asset, force_save))
+        return "/static/{index}.js".format(index=len(self.calls))
+
+
+class JavascriptCacheTest(TestCase):
+
+    def testDebugUrlsAreNotSaved(self):
+        asset_cache = RecordingAssetCache()
+        javascript_cache = JavascriptCache(asset_cache=asset_cache)
+        assets = ["foo.js", StaticAsset("bar.js"), FileAsset("baz.js")]
+        urls = javascript_cache.get_urls(assets, force_save=False)
+        self.assertEqual(urls, ("/static/1.js", "/static/2.js", "/static/3.js"))
+        self.assertEqual([force_save for _, force_save in asset_cache.calls], [False, False, False])
+
+    def testDebugUrlsAreMemoized(self):
+        asset_cache = RecordingAssetCache()
+        javascript_cache = JavascriptCache(asset_cache=asset_cache)
+        first_urls = javascript_cache.get_urls(["foo.js", StaticAsset("bar.js")], force_save=False)
+        second_urls = javascript_cache.get_urls(["foo.js", StaticAsset("bar.js")], force_save=False)
+        self.assertEqual(first_urls, second_urls)
+        self.assertEqual(len(asset_cache.calls), 2)
+
+    def testCompiledAssetIdIncludesBackend(self):
+        asset = get_test_javascript_asset()
+        self.assertEqual(JavascriptAsset([asset], True, False).get_id_params()["compiler"], default_javascript_compiler.get_backend().name)
+        self.assertNotIn("compiler", JavascriptAsset([asset], False, False).get_id_params())
@@ -1,11 +1,187 @@
+# -*- coding: utf-8 -*-
 """Tests for the javascript compiler."""
 
+from __future__ import unicode_literals
+
+import os, shutil, socket, struct, tempfile, threading
+from contextlib import closing
+from io import BytesIO
+
 from django.test import TestCase
+from django.test.utils import override_settings
+
+from optimizations import javascriptcompiler
+from optimizations.javascriptcompiler import JavascriptCompiler, JavascriptError, YuiCompressorBackend, PythonBackend, NodeBackend, JAVASCRIPT_BACKENDS, get_javascript_backend, _nailgun_chunk, _ensure_nailgun, _get_nailgun_pidfile
 
-from optimizations.javascriptcompiler import default_javascript_compiler
+
+# A fake node minifier module, which strips whitespace and appends a non-ascii character.
+FAKE_NODE_MINIFIER_SOURCE = """
+exports.minify = function(source) {
+    if (source.indexOf("fail") !== -1) {
+        return {error: new Error("Fake minifier error.")};
+    }
+    return Promise.resolve({code: source.replace(/\\s+/g, "") + "\\u00e9"});
+};
+"""
 
 
 class JavascriptCompilerTest(TestCase):
-    
+
     def testJavascriptCompiler(self):
-        self.assertEqual(default_javascript_compiler.compile("function(){var foo = 'foo';}"), b'function(){var a="foo"};')
\ No newline at end of file
+        javascript_compiler = JavascriptCompiler(backend=YuiCompressorBackend())
+        self.assertEqual(javascript_compiler.compile("function(){var foo = 'foo';}"), b'function(){var a="foo"};')
+
+    def testPythonJavascriptCompiler(self):
+        backend = PythonBackend("rjsmin")
+        if not backend.is_available():
+            self.skipTest("rjsmin is not installed.")
+        javascript_compiler = JavascriptCompiler(backend=backend)
+        self.assertEqual(javascript_compiler.compile("var foo = 'foo';", force_compile=True), b"var foo='foo';")
+
+
+class NodeBackendTest(TestCase):
+
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.module_dir, "index.js"), "w") as handle:
+            handle.write(FAKE_NODE_MINIFIER_SOURCE)
+        self.backend = NodeBackend(self.module_dir)
+        if not self.backend.is_available():
+            shutil.rmtree(self.module_dir)
+            self.skipTest("node is not installed.")
+
+    def tearDown(self):
+        process = self.backend._process
+        if process is not None:
+            process.kill()
+            process.wait()
+            process.stdin.close()
+            process.stdout.close()
+            self.backend._stderr.close()
+        shutil.rmtree(self.module_dir)
+
+    def testCompile(self):
+        self.assertEqual(self.backend.compile(b"var foo = 'foo';"), "varfoo='foo';é".encode("utf-8"))
+
+    def testCompileNonAscii(self):
+        self.assertEqual(self.backend.compile("var foo = 'é';".encode("utf-8")), "varfoo='é';é".encode("utf-8"))
+
+    def testCompileLargeSource(self):
+        source = b"var foo = 'foo';\n" * 20000
+        self.assertEqual(self.backend.compile(source), "varfoo='foo';".encode("utf-8") * 20000 + "é".encode("utf-8"))
+
+    def testCompileError(self):
+        with self.assertRaises(JavascriptError) as context:
+            self.backend.compile(b"fail();")
+        self.assertEqual(context.exception.detail_message, b"Fake minifier error.")
+        # The process should still be usable after an error.
+        self.assertEqual(self.backend.compile(b"var foo;"), "varfoo;é".encode("utf-8"))
+
+
+class GetJavascriptBackendTest(TestCase):
+
+    def testExplicitName(self):
+        backends = dict(JAVASCRIPT_BACKENDS)
+        for name, backend in JAVASCRIPT_BACKENDS:
+            self.assertIs(get_javascript_backend(name), backend)
+            self.assertEqual(backend.name, name)
+        with override_settings(OPTIMIZATIONS_JS_COMPILER="yuicompressor"):
+            self.assertIs(get_javascript_backend(), backends["yuicompressor"])
+
+    def testAuto(self):
+        expected_backend = next(backend for _, backend in JAVASCRIPT_BACKENDS if backend.is_available())
+        self.assertIs(get_javascript_backend("auto"), expected_backend)
+        with override_settings(OPTIMIZATIONS_JS_COMPILER="auto"):
+            self.assertIs(get_javascript_backend(), expected_backend)
+
+    def testInvalidName(self):
+        self.assertRaises(ValueError, get_javascript_backend, "invalid")
+
+
+class FakeNailgunServer(threading.Thread):
+
+    """Serves a single nailgun request, echoing stdin to stdout in upper case."""
+
+    def __init__(self, connection, returncode=0):
+        super(FakeNailgunServer, self).__init__()
+        self.daemon = True
+        self.connection = connection
+        self.returncode = returncode
+        self.chunks = []
+
+    def read_chunk(self, handle):
+        length, chunk_type = struct.unpack(">Ic", handle.read(5))
+        return chunk_type, handle.read(length)
+
+    def run(self):
+        with closing(self.connection), closing(self.connection.makefile("rb")) as handle:
+            while True:
+                chunk = self.read_chunk(handle)
+                self.chunks.append(chunk)
+                if chunk[0] == b"C":
+                    break
+            data = []
+            while True:
+                self.connection.sendall(_nailgun_chunk(b"S"))
+                chunk_type, chunk_data = self.read_chunk(handle)
+                if chunk_type == b".":
+                    break
+                data.append(chunk_data)
+            self.connection.sendall(_nailgun_chunk(b"1", b"".join(data).upper()))
+            self.connection.sendall(_nailgun_chunk(b"2", b"warning"))
+            self.connection.sendall(_nailgun_chunk(b"X", "{returncode}\n".format(returncode=self.returncode).encode("ascii")))
+
+
+class NailgunTest(TestCase):
+
+    def tearDown(self):
+        javascriptcompiler._nailgun_address = None
+
+    def testNailgunChunk(self):
+        self.assertEqual(_nailgun_chunk(b"A", b"foo"), b"\x00\x00\x00\x03Afoo")
+        self.assertEqual(_nailgun_chunk(b"."), b"\x00\x00\x00\x00.")
+
+    def compileNailgun(self, chunks, returncode=0):
+        client, server_connection = socket.socketpair()
+        server = FakeNailgunServer(server_connection, returncode)
+        server.start()
+        handle = BytesIO()
+        try:
+            with closing(client):
+                YuiCompressorBackend()._compile_nailgun(client, chunks, handle)
+        finally:
+            server.join()
+        return server, handle.getvalue()
+
+    def testCompileNailgun(self):
+        source = b"var foo = 'foo';" * 10000
+        server, result = self.compileNailgun((source[:100], b"", source[100:]))
+        self.assertEqual(result, source.upper())
+        self.assertEqual(server.chunks[0], (b"A", b"--type"))
+        self.assertEqual(server.chunks[-2], (b"D", os.getcwd().encode("utf-8")))
+        self.assertEqual(server.chunks[-1], (b"C", b"com.yahoo.platform.yui.compressor.Bootstrap"))
+
+    def testCompileNailgunError(self):
+        with self.assertRaises(JavascriptError) as context:
+            self.compileNailgun((b"var foo;",), returncode=1)
+        self.assertEqual(context.exception.detail_message, b"warning")
+
+    def testEnsureNailgunIgnoresUnrecordedServer(self):
+        nailgun_dir = tempfile.mkdtemp()
+        try:
+            with closing(socket.socket()) as listener:
+                listener.bind(("127.0.0.1", 0))
+                listener.listen(1)
+                address = listener.getsockname()
+                with override_settings(OPTIMIZATIONS_NAILGUN_JAR="nailgun.jar", OPTIMIZATIONS_NAILGUN_DIR=nailgun_dir, OPTIMIZATIONS_NAILGUN_ADDRESS=address):
+                    self.assertEqual(_ensure_nailgun(), None)
+                    # Once the server is recorded in the private pidfile, it is used.
+                    with open(_get_nailgun_pidfile(nailgun_dir, address), "w") as handle:
+                        handle.write("{pid}\n".format(pid=os.getpid()))
+                    self.assertEqual(_ensure_nailgun(), address)
+                    javascriptcompiler._nailgun_address = None
+                    # A directory that other users can write to is never trusted.
+                    os.chmod(nailgun_dir, 0o777)
+                    self.assertEqual(_ensure_nailgun(), None)
+        finally:
+            shutil.rmtree(nailgun_dir)
@@ -1,17 +1,75 @@
 """Tests for the asset cache."""
 
-import hashlib
+import hashlib, os.path, shutil, tempfile
+
+from PIL import Image
 
 from django.test import TestCase
-from django.core.files.storage import default_storage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage, FileSystemStorage
 
 from optimizations.assetcache import default_asset_cache
-from optimizations.thumbnailcache import default_thumbnail_cache
+from optimizations.thumbnailcache import default_thumbnail_cache, ThumbnailCache, ThumbnailError, Size, LazyImage, _fast_image_size, _write_thumbnail, _get_resample_filter
 from test_optimizations.tests.base import get_test_thumbnail_asset
 
 
+class CountingAssetCache(object):
+
+    """An asset cache that counts the calls made to get_name_and_meta."""
+
+    def __init__(self):
+        self.calls = 0
+        self._storage = default_asset_cache._storage
+
+    def get_name_and_meta(self, asset):
+        self.calls += 1
+        return default_asset_cache.get_name_and_meta(asset)
+
+
 class ThumbnailCacheTest(TestCase):
     
+    def testSizeConstrain(self):
+        self.assertEqual(Size(100, 100).constrain(Size(400, 200)), Size(100, 50))
+        self.assertEqual(Size(100, 100).constrain(Size(200, 400)), Size(50, 100))
+        self.assertEqual(Size(100, 100).constrain(Size(300, 200)), Size(100, 67))
+        self.assertEqual(Size(3, 3).constrain(Size(2, 1)), Size(3, 2))
+    
+    def testGetResampleFilter(self):
+        self.assertEqual(_get_resample_filter("bicubic"), Image.BICUBIC)
+        self.assertRaises(ImproperlyConfigured, _get_resample_filter, "foo")
+        self.assertRaises(ImproperlyConfigured, _get_resample_filter, None)
+
+    def testLazyImageSizeMatchesImageSize(self):
+        asset, image_size = get_test_thumbnail_asset()
+        self.assertEqual(LazyImage(asset).size, image_size)
+    
+    def testThumbnailCacheCanBeCreated(self):
+        asset, image_size = get_test_thumbnail_asset()
+        thumbnail_cache = ThumbnailCache()
+        self.assertEqual(thumbnail_cache.get_thumbnail(asset, 10, 10, "crop").width, 10)
+
+    def testThumbnailNameAndMetaAreMemoized(self):
+        asset, image_size = get_test_thumbnail_asset()
+        asset_cache = CountingAssetCache()
+        thumbnail_cache = ThumbnailCache(asset_cache=asset_cache)
+        thumbnail = thumbnail_cache.get_thumbnail(asset, 10, 10, "crop")
+        self.assertEqual(thumbnail.width, 10)
+        memoized_thumbnail = thumbnail_cache.get_thumbnail(asset, 10, 10, "crop")
+        # Thumbnails are never shared, but their names and meta are.
+        self.assertIsNot(memoized_thumbnail, thumbnail)
+        self.assertIsNot(memoized_thumbnail._asset, thumbnail._asset)
+        self.assertEqual(memoized_thumbnail.url, thumbnail.url)
+        self.assertEqual(memoized_thumbnail.height, 10)
+        self.assertEqual(asset_cache.calls, 1)
+
+    def testThumbnailNameAndMetaMemoExpires(self):
+        asset, image_size = get_test_thumbnail_asset()
+        asset_cache = CountingAssetCache()
+        thumbnail_cache = ThumbnailCache(asset_cache=asset_cache, thumbnail_cache_timeout=-1)
+        self.assertEqual(thumbnail_cache.get_thumbnail(asset, 10, 10, "crop").width, 10)
+        self.assertEqual(thumbnail_cache.get_thumbnail(asset, 10, 10, "crop").width, 10)
+        self.assertEqual(asset_cache.calls, 2)
+
     def testImageCacheForSameSizeImageLeavesImageUnmodified(self):
         asset, image_size = get_test_thumbnail_asset()
         width, height = image_size
@@ -21,6 +79,41 @@ class ThumbnailCacheTest(TestCase):
         # Make sure the assets are identical.
         self.assertEqual(hashlib.sha1(default_storage.open(default_asset_cache.get_name(asset)).read()).hexdigest(), hashlib.sha1(default_storage.open(default_asset_cache.get_name(thumbnail._asset)).read()).hexdigest())
         
+    def testImageCacheWithinOnePixelCopiesImage(self):
+        asset, image_size = get_test_thumbnail_asset()
+        width, height = image_size
+        thumbnail = default_thumbnail_cache.get_thumbnail(asset, width - 1, height - 1, "resize")
+        self.assertEqual(thumbnail.width, width - 1)
+        self.assertEqual(thumbnail.height, height - 1)
+        # Make sure the source was copied, not resampled.
+        with open(asset.get_path(), "rb") as handle:
+            self.assertEqual(hashlib.sha1(handle.read()).hexdigest(), hashlib.sha1(default_storage.open(default_asset_cache.get_name(thumbnail._asset)).read()).hexdigest())
+
+    def testWriteThumbnailFailureRemovesFile(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = FileSystemStorage(location=temp_dir)
+            def write(handle):
+                handle.write(b"incomplete")
+                raise IOError("Disk full.")
+            self.assertRaises(ThumbnailError, _write_thumbnail, storage, "thumbnails/foo.png", storage.path("thumbnails/foo.png"), write)
+            self.assertFalse(storage.exists("thumbnails/foo.png"))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def testWriteThumbnailRecreatesRemovedDirectory(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = FileSystemStorage(location=temp_dir)
+            write = lambda handle: handle.write(b"thumbnail")
+            _write_thumbnail(storage, "thumbnails/foo.png", storage.path("thumbnails/foo.png"), write)
+            # Remove the directory behind the thumbnail cache's back.
+            shutil.rmtree(storage.path("thumbnails"))
+            _write_thumbnail(storage, "thumbnails/bar.png", storage.path("thumbnails/bar.png"), write)
+            self.assertTrue(storage.exists("thumbnails/bar.png"))
+        finally:
+            shutil.rmtree(temp_dir)
+
     def testImageCacheResizeSmaller(self):
         asset, image_size = get_test_thumbnail_asset()
         width, height = image_size
@@ -75,3 +168,56 @@ class ThumbnailCacheTest(TestCase):
         self.assertEqual(thumbnail.height, height)
         # Make sure the file contents are not identical.
         self.assertEqual(hashlib.sha1(default_storage.open(default_asset_cache.get_name(asset)).read()).hexdigest(), hashlib.sha1(default_storage.open(default_asset_cache.get_name(thumbnail._asset)).read()).hexdigest())
+
+
+class FastImageSizeTest(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def saveImage(self, name, mode="RGB", size=(123, 45), **kwargs):
+        path = os.path.join(self.temp_dir, name)
+        Image.new(mode, size, "red").save(path, **kwargs)
+        return path
+
+    def assertFastImageSizeWorks(self, path):
+        self.assertEqual(_fast_image_size(path), Image.open(path).size)
+
+    def testBaselineJpeg(self):
+        self.assertFastImageSizeWorks(self.saveImage("baseline.jpg"))
+
+    def testProgressiveJpeg(self):
+        self.assertFastImageSizeWorks(self.saveImage("progressive.jpg", progressive=True))
+
+    def testJpegWithApplicationSegments(self):
+        exif = b"Exif\x00\x00MM\x00*\x00\x00\x00\x08\x00\x00\x00\x00\x00\x00"
+        self.assertFastImageSizeWorks(self.saveImage("exif.jpg", exif=exif, icc_profile=b"\x00" * 5000))
+
+    def testCmykJpeg(self):
+        self.assertFastImageSizeWorks(self.saveImage("cmyk.jpg", mode="CMYK"))
+
+    def testPng(self):
+        self.assertFastImageSizeWorks(self.saveImage("image.png"))
+
+    def testGif(self):
+        self.assertFastImageSizeWorks(self.saveImage("image.gif", mode="P"))
+
+    def testTruncatedJpeg(self):
+        path = self.saveImage("truncated.jpg", exif=b"Exif\x00\x00" + b"\x00" * 1000)
+        with open(path, "rb") as handle:
+            data = handle.read(500)
+        with open(path, "wb") as handle:
+            handle.write(data)
+        self.assertEqual(_fast_image_size(path), None)
+
+    def testCorruptImage(self):
+        path = os.path.join(self.temp_dir, "corrupt.jpg")
+        with open(path, "wb") as handle:
+            handle.write(b"\xff\xd8\xff\xe0\x00\x01garbage")
+        self.assertEqual(_fast_image_size(path), None)
+        with open(path, "wb") as handle:
+            handle.write(b"not an image at all")
+        self.assertEqual(_fast_image_size(path), None)